@@ -1,44 +1,327 @@
+import asyncio
+import hashlib
+import json
+import logging
 import os
-from datetime import datetime, timedelta
-from time import sleep
-from typing import Literal, TypedDict
+import re
+from collections import Counter, deque
+from functools import lru_cache
+from time import monotonic, sleep
+from typing import Any, Coroutine, Literal, Optional, TypedDict, TypeVar
 
-from anthropic import Anthropic
+import diskcache
+import httpx
+from aiolimiter import AsyncLimiter
+from anthropic import NOT_GIVEN, Anthropic, AsyncAnthropic
+from anthropic import APITimeoutError as AnthropicAPITimeoutError
+from anthropic import RateLimitError as AnthropicRateLimitError
 from data_structures import MODEL_IDS
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import APITimeoutError, AsyncOpenAI, OpenAI, RateLimitError
+from tenacity import (
+    retry,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_random_exponential,
+)
 
-secrets = load_dotenv()
-OPEN_AI_API_KEY = os.getenv("OPEN_AI_API_KEY")
-open_ai_client = OpenAI(api_key=OPEN_AI_API_KEY)
-ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
-anthropic_client = Anthropic(api_key=ANTHROPIC_API_KEY)
+# uvloop schedules the many small concurrent call coroutines considerably
+# faster than the default selector event loop. Installing it here makes every
+# asyncio.run() in the sync wrappers pick it up; it is purely optional.
+try:
+    import uvloop
+
+    uvloop.install()
+except ImportError:
+    pass
+
+# Keep request payloads off stdout by default; set e.g. LOGLEVEL=DEBUG to see
+# them. Unconditional print()s serialize through a lock and throttle the
+# async call paths.
+logging.basicConfig(level=os.getenv("LOGLEVEL", "WARNING").upper())
+logger = logging.getLogger(__name__)
+
+# Share one pooled HTTP client (and one async equivalent) across both SDKs so
+# that repeated calls reuse kept-alive connections instead of paying a fresh
+# TCP+TLS handshake each time.
+_HTTP_LIMITS = httpx.Limits(
+    max_connections=100, max_keepalive_connections=50, keepalive_expiry=90
+)
+
+# The .env load and client construction are lazy singletons so that code
+# paths which never call an LLM (e.g. dumping DBs to CSV) don't pay for them
+# at import time.
+
+
+@lru_cache(maxsize=1)
+def _load_secrets():
+    load_dotenv()
+
+
+@lru_cache(maxsize=1)
+def _shared_http_client() -> httpx.Client:
+    # HTTP/2 multiplexes concurrent requests over fewer connections, which
+    # keeps handshake count down at high concurrency.
+    return httpx.Client(limits=_HTTP_LIMITS, http2=True)
+
+
+# The async clients cannot be process-wide singletons: an AsyncClient's
+# keep-alive connections are bound to the event loop they were opened on, and
+# the sync wrappers run a fresh loop per asyncio.run call, so a client cached
+# across loops fails with "Event loop is closed" on the second call. Each
+# async client (and the SDK clients holding one) is scoped to the running
+# loop instead.
+
+
+def _for_running_loop(cache: dict, factory):
+    loop = asyncio.get_running_loop()
+    if loop not in cache:
+        # Drop clients whose loops have since closed; each sync-wrapper call
+        # runs its own short-lived loop.
+        for cached_loop in list(cache):
+            if cached_loop.is_closed():
+                del cache[cached_loop]
+        cache[loop] = factory()
+    return cache[loop]
+
+
+_async_http_clients: dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+
+
+def _shared_async_http_client() -> httpx.AsyncClient:
+    return _for_running_loop(
+        _async_http_clients,
+        lambda: httpx.AsyncClient(limits=_HTTP_LIMITS, http2=True),
+    )
+
+
+@lru_cache(maxsize=1)
+def open_ai_client() -> OpenAI:
+    _load_secrets()
+    return OpenAI(
+        api_key=os.getenv("OPEN_AI_API_KEY"), http_client=_shared_http_client()
+    )
+
+
+_async_open_ai_clients: dict[asyncio.AbstractEventLoop, AsyncOpenAI] = {}
+
+
+def async_open_ai_client() -> AsyncOpenAI:
+    _load_secrets()
+    return _for_running_loop(
+        _async_open_ai_clients,
+        lambda: AsyncOpenAI(
+            api_key=os.getenv("OPEN_AI_API_KEY"),
+            http_client=_shared_async_http_client(),
+        ),
+    )
+
+
+@lru_cache(maxsize=1)
+def anthropic_client() -> Anthropic:
+    _load_secrets()
+    return Anthropic(
+        api_key=os.getenv("ANTHROPIC_API_KEY"), http_client=_shared_http_client()
+    )
+
+
+_async_anthropic_clients: dict[asyncio.AbstractEventLoop, AsyncAnthropic] = {}
+
+
+def async_anthropic_client() -> AsyncAnthropic:
+    _load_secrets()
+    return _for_running_loop(
+        _async_anthropic_clients,
+        lambda: AsyncAnthropic(
+            api_key=os.getenv("ANTHROPIC_API_KEY"),
+            http_client=_shared_async_http_client(),
+        ),
+    )
+
+
+T = TypeVar("T")
+
+
+def run_sync(coroutine: Coroutine[Any, Any, T]) -> T:
+    """
+    Runs a coroutine to completion from synchronous code. The sync wrappers
+    are driven from Jupyter cells, where a loop is already running and
+    asyncio.run would raise; the running loop is patched for re-entry via
+    nest_asyncio and reused in that case.
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    import nest_asyncio
+
+    nest_asyncio.apply(loop)
+    return loop.run_until_complete(coroutine)
+
+
+class _SyncRateLimiter:
+    """
+    Sliding-window rate limiter for the synchronous call path: only sleeps
+    when the window is actually full, rather than padding every call.
+    """
+
+    def __init__(self, max_calls: int, period_in_seconds: float):
+        self.max_calls = max_calls
+        self.period_in_seconds = period_in_seconds
+        self.call_times: deque[float] = deque()
+
+    def acquire(self):
+        while True:
+            now = monotonic()
+            while self.call_times and now - self.call_times[0] > self.period_in_seconds:
+                self.call_times.popleft()
+            if len(self.call_times) < self.max_calls:
+                self.call_times.append(now)
+                return
+            sleep(self.period_in_seconds - (now - self.call_times[0]))
+
+
+# Anthropic's API is rate limited to 50 requests per minute, so we meter
+# Anthropic calls through a token bucket instead of sleeping between them.
+# We target 49/min to stay safely under the cap.
+anthropic_limiter = AsyncLimiter(49, 60)
+anthropic_sync_limiter = _SyncRateLimiter(49, 60)
+# Cap on the number of requests in flight at once, across both providers.
+MAX_CONCURRENT_REQUESTS = 50
+
+# Rate limits and timeouts are transient: back off exponentially with full
+# jitter (so concurrent callers don't retry in lockstep) instead of letting a
+# single 429 crash a whole batch. Both SDKs honour Retry-After on their own
+# internal retries; this covers the attempts they give up on.
+_llm_retry = retry(
+    retry=retry_if_exception_type(
+        (
+            RateLimitError,
+            APITimeoutError,
+            AnthropicRateLimitError,
+            AnthropicAPITimeoutError,
+        )
+    ),
+    wait=wait_random_exponential(min=1, max=60),
+    stop=stop_after_attempt(8),
+    reraise=True,
+)
+
+# Every call uses temperature=0.0, so `(model_id, messages)` uniquely
+# determines the response and it is safe to cache responses on disk across
+# reruns. Opt in with `LLM_CACHE=1`; entries expire after `LLM_CACHE_TTL`
+# seconds when that is set.
+llm_cache: Optional[diskcache.Cache] = (
+    diskcache.Cache(".llm_cache") if os.getenv("LLM_CACHE") == "1" else None
+)
+_llm_cache_ttl_env = os.getenv("LLM_CACHE_TTL")
+llm_cache_ttl: Optional[float] = (
+    float(_llm_cache_ttl_env) if _llm_cache_ttl_env is not None else None
+)
+llm_cache_stats = Counter()
+
+
+def cache_stats() -> dict[str, int]:
+    """
+    Hit/miss counts for the on-disk response cache. Misses are counted when
+    a fresh response is stored, so cache lookups retried along the async
+    path are not double counted.
+    """
+    return dict(llm_cache_stats)
 
 
 class LLMMessage(TypedDict):
-    role: Literal["user", "assistant"]
+    role: Literal["system", "user", "assistant"]
     content: str
 
 
-def llm_api_call(model_id: MODEL_IDS, messages: list[LLMMessage]) -> str:
-    # We may accidently introduce large whitespace in the contents of the messages,
-    # so we should strip them.
-    messages = [
+def split_system_message(
+    messages: list[LLMMessage],
+) -> tuple[Optional[str], list[LLMMessage]]:
+    """
+    Splits a leading system message off a message list. OpenAI accepts system
+    messages inline; Anthropic takes them as a separate `system` parameter.
+    """
+    if messages and messages[0]["role"] == "system":
+        return messages[0]["content"], messages[1:]
+    return None, messages
+
+
+def _anthropic_system_blocks(system_prompt: Optional[str]) -> list[dict]:
+    # Mark the static prefix as cacheable so Anthropic can reuse its KV cache
+    # (and discount the tokens) across calls that share it.
+    if system_prompt is None:
+        return []
+    return [
         {
-            "role": message["role"],
-            "content": message["content"]
-            .strip()
-            .replace("  ", " ")
-            .replace("    ", " ")
-            .replace("\n\n", "\n"),
+            "type": "text",
+            "text": system_prompt,
+            "cache_control": {"type": "ephemeral"},
         }
+    ]
+
+
+# Runs of spaces/tabs collapse to one space; runs of blank lines collapse to
+# one newline.
+_WHITESPACE_RE = re.compile(r"[ \t]{2,}| *\n\n+ *")
+
+
+def _normalize(content: str) -> str:
+    return _WHITESPACE_RE.sub(
+        lambda match: "\n" if "\n" in match.group(0) else " ", content.strip()
+    )
+
+
+def _clean_messages(messages: list[LLMMessage]) -> list[LLMMessage]:
+    # We may accidently introduce large whitespace in the contents of the messages,
+    # so we should strip them. A single compiled-regex pass avoids the chain of
+    # intermediate strings the old .replace() calls allocated.
+    return [
+        {"role": message["role"], "content": _normalize(message["content"])}
         for message in messages
     ]
-    print(messages)
+
+
+def _cache_key(model_id: MODEL_IDS, messages: list[LLMMessage]) -> str:
+    return hashlib.sha256(
+        json.dumps(
+            {
+                "model": model_id,
+                "messages": messages,
+                "temperature": 0.0,
+                "max_tokens": 1024,
+            },
+            sort_keys=True,
+        ).encode()
+    ).hexdigest()
+
+
+def _cache_get(model_id: MODEL_IDS, messages: list[LLMMessage]) -> Optional[str]:
+    if llm_cache is None:
+        return None
+    cached = llm_cache.get(_cache_key(model_id, messages))
+    if cached is not None:
+        llm_cache_stats["hits"] += 1
+    return cached
+
+
+def _cache_set(model_id: MODEL_IDS, messages: list[LLMMessage], response: str):
+    if llm_cache is not None:
+        llm_cache.set(_cache_key(model_id, messages), response, expire=llm_cache_ttl)
+        llm_cache_stats["misses"] += 1
+
+
+@_llm_retry
+def llm_api_call(model_id: MODEL_IDS, messages: list[LLMMessage]) -> str:
+    messages = _clean_messages(messages)
+    cached = _cache_get(model_id, messages)
+    if cached is not None:
+        return cached
+    logger.debug("llm_api_call messages: %r", messages)
     match model_id:
         case "gpt-4-turbo-2024-04-09":
             response = (
-                open_ai_client.chat.completions.create(
+                open_ai_client().chat.completions.create(
                     model=model_id,
                     messages=messages,  # type: ignore
                     temperature=0.0,
@@ -48,29 +331,188 @@ def llm_api_call(model_id: MODEL_IDS, messages: list[LLMMessage]) -> str:
                 .message.content
             )
             assert response is not None
+            _cache_set(model_id, messages, response)
             return response
         case (
             "claude-3-haiku-20240307"
             | "claude-3-sonnet-20240229"
             | "claude-3-opus-20240229"
         ):
-            start_time = datetime.now()
+            anthropic_sync_limiter.acquire()
+            system_prompt, chat_messages = split_system_message(messages)
             response = (
-                anthropic_client.messages.create(
+                anthropic_client().messages.create(
                     max_tokens=1024,
                     model=model_id,
-                    messages=messages,  # type: ignore
+                    system=_anthropic_system_blocks(system_prompt) or NOT_GIVEN,  # type: ignore
+                    messages=chat_messages,  # type: ignore
                     temperature=0.0,
                 )
                 .content[0]
                 .text
             )
-            # Anthropic's API is rate limited to 50 requests per minute.
-            time_taken_in_ms = (datetime.now() - start_time) / timedelta(milliseconds=1)
-            if time_taken_in_ms < 1000:
-                sleep_time_in_ms = 1500 - time_taken_in_ms
-                print(f"Took {time_taken_in_ms}ms, sleeping for {sleep_time_in_ms}ms")
-                sleep(sleep_time_in_ms / 1000)
+            _cache_set(model_id, messages, response)
             return response
         case _:
             raise ValueError(f"Unsupported `model_id`: {model_id}")
+
+
+@_llm_retry
+async def llm_api_call_async(model_id: MODEL_IDS, messages: list[LLMMessage]) -> str:
+    messages = _clean_messages(messages)
+    cached = _cache_get(model_id, messages)
+    if cached is not None:
+        return cached
+    logger.debug("llm_api_call messages: %r", messages)
+    # Both branches stream and accumulate chunks rather than awaiting the
+    # full response body: the event loop yields on every chunk, so sibling
+    # calls (and downstream DB writes scheduled as tasks) overlap with the
+    # time tokens spend in flight.
+    match model_id:
+        case "gpt-4-turbo-2024-04-09":
+            stream = await async_open_ai_client().chat.completions.create(
+                model=model_id,
+                messages=messages,  # type: ignore
+                temperature=0.0,
+                max_tokens=1024,
+                stream=True,
+            )
+            chunks: list[str] = []
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content is not None:
+                    chunks.append(chunk.choices[0].delta.content)
+            response = "".join(chunks)
+        case (
+            "claude-3-haiku-20240307"
+            | "claude-3-sonnet-20240229"
+            | "claude-3-opus-20240229"
+        ):
+            async with anthropic_limiter:
+                system_prompt, chat_messages = split_system_message(messages)
+                async with async_anthropic_client().messages.stream(
+                    max_tokens=1024,
+                    model=model_id,
+                    system=_anthropic_system_blocks(system_prompt) or NOT_GIVEN,  # type: ignore
+                    messages=chat_messages,  # type: ignore
+                    temperature=0.0,
+                ) as message_stream:
+                    response = "".join(
+                        [text async for text in message_stream.text_stream]
+                    )
+        case _:
+            raise ValueError(f"Unsupported `model_id`: {model_id}")
+    _cache_set(model_id, messages, response)
+    return response
+
+
+class LLMScheduler:
+    """
+    Groups queued prompts by model so consecutive dispatches hit the same
+    endpoint, which maximises keep-alive reuse and prompt-cache locality even
+    when call sites interleave models arbitrarily. One background consumer
+    per model drains up to `batch_size` queued requests at a time and fires
+    each wave without waiting for it, so grouping never caps concurrency:
+    in-flight requests are bounded only by a per-model semaphore sized to
+    `MAX_CONCURRENT_REQUESTS`.
+    """
+
+    def __init__(self, batch_size: int = 10):
+        self.batch_size = batch_size
+        self._queues: dict[MODEL_IDS, asyncio.Queue] = {}
+        self._consumers: dict[MODEL_IDS, asyncio.Task] = {}
+        # Strong references keep in-flight dispatch tasks alive; the loop
+        # only holds weak ones.
+        self._dispatch_tasks: set[asyncio.Task] = set()
+
+    async def submit(self, model_id: MODEL_IDS, messages: list[LLMMessage]) -> str:
+        if model_id not in self._queues:
+            self._queues[model_id] = asyncio.Queue()
+            self._consumers[model_id] = asyncio.create_task(self._consume(model_id))
+        future: asyncio.Future[str] = asyncio.get_running_loop().create_future()
+        await self._queues[model_id].put((messages, future))
+        return await future
+
+    async def _consume(self, model_id: MODEL_IDS):
+        queue = self._queues[model_id]
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+        async def dispatch(messages: list[LLMMessage], future: asyncio.Future):
+            async with semaphore:
+                try:
+                    future.set_result(await llm_api_call_async(model_id, messages))
+                except Exception as error:
+                    future.set_exception(error)
+
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < self.batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            # Fire the drained wave as tasks rather than awaiting it, so the
+            # consumer goes straight back to draining while the wave is in
+            # flight and callers see the full MAX_CONCURRENT_REQUESTS fan-out.
+            for messages, future in batch:
+                task = asyncio.create_task(dispatch(messages, future))
+                self._dispatch_tasks.add(task)
+                task.add_done_callback(self._dispatch_tasks.discard)
+
+    def close(self):
+        for consumer in self._consumers.values():
+            consumer.cancel()
+        for task in self._dispatch_tasks:
+            task.cancel()
+        self._queues.clear()
+        self._consumers.clear()
+        self._dispatch_tasks.clear()
+
+
+_schedulers: dict[asyncio.AbstractEventLoop, LLMScheduler] = {}
+
+
+def _loop_scheduler() -> LLMScheduler:
+    # Consumer tasks belong to the loop that created them, so the shared
+    # scheduler is scoped per running loop like the async clients; pending
+    # consumers are cancelled by asyncio.run's shutdown when a loop ends.
+    return _for_running_loop(_schedulers, LLMScheduler)
+
+
+async def llm_api_calls_async(
+    calls: list[tuple[MODEL_IDS, list[LLMMessage]]],
+    max_concurrency: int = MAX_CONCURRENT_REQUESTS,
+) -> list[str]:
+    """
+    Fires a batch of independent LLM calls concurrently and returns their
+    responses in the same order as `calls`. Identical calls within the batch
+    are dispatched once and share a response, so duplicate prompts cost one
+    request. Dispatch goes through the loop's `LLMScheduler`, which groups
+    queued calls by model so mixed-model batches still hit each endpoint in
+    waves. `max_concurrency` can be tuned down to match provider tier
+    limits.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def bounded_call(model_id: MODEL_IDS, messages: list[LLMMessage]) -> str:
+        # Resolve cache hits before taking a semaphore slot so cached calls
+        # never hold up real network traffic.
+        cached = _cache_get(model_id, _clean_messages(messages))
+        if cached is not None:
+            return cached
+        async with semaphore:
+            return await _loop_scheduler().submit(model_id, messages)
+
+    # Map each position to its distinct (model, cleaned payload) key; only
+    # the first occurrence of a key is dispatched and the response is
+    # scattered back to every duplicate position.
+    unique_positions: dict[str, int] = {}
+    position_keys: list[str] = []
+    unique_calls: list[tuple[MODEL_IDS, list[LLMMessage]]] = []
+    for model_id, messages in calls:
+        key = _cache_key(model_id, _clean_messages(messages))
+        position_keys.append(key)
+        if key not in unique_positions:
+            unique_positions[key] = len(unique_calls)
+            unique_calls.append((model_id, messages))
+
+    responses = await asyncio.gather(
+        *(bounded_call(model_id, messages) for model_id, messages in unique_calls)
+    )
+    return [responses[unique_positions[key]] for key in position_keys]
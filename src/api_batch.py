@@ -0,0 +1,121 @@
+import json
+from time import sleep
+
+from api import (
+    LLMMessage,
+    anthropic_client,
+    open_ai_client,
+    split_system_message,
+)
+from data_structures import MODEL_IDS
+
+# A batch request is (custom_id, model_id, messages). Batch APIs cost 50% less
+# than the synchronous endpoints and are not subject to per-minute rate
+# limits, so they are the right fit for offline sweeps like bulk argument
+# generation.
+BatchRequest = tuple[str, MODEL_IDS, list[LLMMessage]]
+
+POLL_INTERVAL_IN_SECONDS = 30
+
+
+def submit_openai_batch(requests: list[BatchRequest]) -> str:
+    """
+    Uploads a .jsonl of chat-completion requests and starts an OpenAI batch.
+    Returns the batch id to poll with `collect_openai_batch`.
+    """
+    records = [
+        {
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": model_id,
+                "messages": messages,
+                "temperature": 0.0,
+                "max_tokens": 1024,
+            },
+        }
+        for custom_id, model_id, messages in requests
+    ]
+    jsonl = "\n".join(json.dumps(record) for record in records).encode()
+    batch_input_file = open_ai_client().files.create(
+        file=("batch_requests.jsonl", jsonl), purpose="batch"
+    )
+    batch = open_ai_client().batches.create(
+        input_file_id=batch_input_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+    )
+    return batch.id
+
+
+def collect_openai_batch(batch_id: str) -> dict[str, str]:
+    """
+    Polls an OpenAI batch until it completes and returns
+    `{custom_id: response_text}`.
+    """
+    while True:
+        batch = open_ai_client().batches.retrieve(batch_id)
+        if batch.status == "completed":
+            break
+        assert batch.status in (
+            "validating",
+            "in_progress",
+            "finalizing",
+        ), f"Batch {batch_id} ended with status: {batch.status}"
+        print(f"Batch {batch_id} is {batch.status}, polling again shortly...")
+        sleep(POLL_INTERVAL_IN_SECONDS)
+
+    assert batch.output_file_id is not None
+    output = open_ai_client().files.content(batch.output_file_id).text
+    responses: dict[str, str] = {}
+    for line in output.splitlines():
+        record = json.loads(line)
+        responses[record["custom_id"]] = record["response"]["body"]["choices"][0][
+            "message"
+        ]["content"]
+    return responses
+
+
+def submit_anthropic_batch(requests: list[BatchRequest]) -> str:
+    """
+    Starts an Anthropic Message Batch. Returns the batch id to poll with
+    `collect_anthropic_batch`.
+    """
+    batch_requests = []
+    for custom_id, model_id, messages in requests:
+        system_prompt, chat_messages = split_system_message(messages)
+        params: dict = {
+            "model": model_id,
+            "messages": chat_messages,
+            "temperature": 0.0,
+            "max_tokens": 1024,
+        }
+        if system_prompt is not None:
+            params["system"] = system_prompt
+        batch_requests.append({"custom_id": custom_id, "params": params})
+    batch = anthropic_client().beta.messages.batches.create(requests=batch_requests)
+    return batch.id
+
+
+def collect_anthropic_batch(batch_id: str) -> dict[str, str]:
+    """
+    Polls an Anthropic Message Batch until it ends and returns
+    `{custom_id: response_text}`.
+    """
+    while True:
+        batch = anthropic_client().beta.messages.batches.retrieve(batch_id)
+        if batch.processing_status == "ended":
+            break
+        print(
+            f"Batch {batch_id} is {batch.processing_status}, polling again shortly..."
+        )
+        sleep(POLL_INTERVAL_IN_SECONDS)
+
+    responses: dict[str, str] = {}
+    for result in anthropic_client().beta.messages.batches.results(batch_id):
+        assert (
+            result.result.type == "succeeded"
+        ), f"Request {result.custom_id} ended with result: {result.result.type}"
+        responses[result.custom_id] = result.result.message.content[0].text
+    return responses
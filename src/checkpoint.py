@@ -0,0 +1,66 @@
+import json
+import os
+from typing import Optional
+
+FSYNC_EVERY_N_RECORDS = 10
+
+
+def resume(path: str) -> dict[str, str]:
+    """
+    Reads completed responses from an existing checkpoint file as
+    `{custom_id: response}`, so work already recorded there can be skipped.
+    """
+    if not os.path.exists(path):
+        return {}
+    responses: dict[str, str] = {}
+    with open(path) as checkpoint_file:
+        for line in checkpoint_file:
+            record = json.loads(line)
+            responses[record["custom_id"]] = record["response"]
+    return responses
+
+
+class CheckpointWriter:
+    """
+    Append-only JSONL checkpoint of completed LLM responses, keyed by the
+    same custom ids used for the batch APIs ("question_id:option_index:length").
+    A crashed run resumes from whatever was already written instead of paying
+    for those calls again.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.completed: dict[str, str] = {}
+        self._file = None
+        self._records_since_fsync = 0
+
+    def __enter__(self) -> "CheckpointWriter":
+        self.completed = resume(self.path)
+        self._file = open(self.path, "a")
+        return self
+
+    def __exit__(self, *exc_info):
+        assert self._file is not None
+        self._fsync()
+        self._file.close()
+        self._file = None
+
+    def get(self, custom_id: str) -> Optional[str]:
+        return self.completed.get(custom_id)
+
+    def write(self, custom_id: str, response: str):
+        assert (
+            self._file is not None
+        ), "CheckpointWriter must be used as a context manager."
+        self._file.write(
+            json.dumps({"custom_id": custom_id, "response": response}) + "\n"
+        )
+        self.completed[custom_id] = response
+        self._records_since_fsync += 1
+        if self._records_since_fsync >= FSYNC_EVERY_N_RECORDS:
+            self._fsync()
+
+    def _fsync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._records_since_fsync = 0
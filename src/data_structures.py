@@ -1,9 +1,29 @@
 import csv
-from dataclasses import asdict, dataclass
+import json
+import random
+import re
+from dataclasses import dataclass, field, fields
 from datetime import datetime
 from typing import Any, Literal, Optional
 from uuid import UUID
 
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+try:
+    import orjson
+
+    def _json_dumps(value: Any) -> str:
+        # orjson is a C extension, ~5x faster than stdlib json on the nested
+        # lists we serialize per row.
+        return orjson.dumps(value).decode()
+
+except ImportError:
+
+    def _json_dumps(value: Any) -> str:
+        return json.dumps(value)
+
+
 MODEL_IDS = Literal[
     "gpt-4-turbo-2024-04-09",
     "claude-3-haiku-20240307",
@@ -11,13 +31,48 @@ MODEL_IDS = Literal[
     "claude-3-opus-20240229",
 ]
 
+_LABELS = ("A", "B", "C", "D")
+_LABEL_TO_INDEX = {label: index for index, label in enumerate(_LABELS)}
+
+# Only standalone labels count: a bare `"A" in response` check false-positives
+# on any word containing the letter (e.g. "Actually...").
+_LABEL_RE = re.compile(r"\b([ABCD])\b")
+_INCORRECT_RE = re.compile(r"incorrect", re.IGNORECASE)
+_CORRECT_RE = re.compile(r"correct", re.IGNORECASE)
+
+
+def extract_label(response: str, valid_labels: tuple[str, ...] = _LABELS) -> Optional[str]:
+    """
+    Returns the single option label mentioned as a standalone word in the
+    response, or `None` when no label (or more than one distinct label)
+    appears.
+    """
+    labels = {label for label in _LABEL_RE.findall(response) if label in valid_labels}
+    if len(labels) != 1:
+        return None
+    return labels.pop()
+
+
+# `uuid.uuid4()` reads /dev/urandom on every call, which shows up in profiles
+# once a batched run mints thousands of response ids. A process-local PRNG is
+# seeded from urandom once instead; these ids are row keys, not secrets.
+_UUID_RNG = random.Random()
+
+
+def fast_uuid4() -> UUID:
+    """
+    Returns a random version-4 UUID from a PRNG seeded once at import,
+    avoiding the per-call urandom read of `uuid.uuid4()`.
+    """
+    return UUID(int=_UUID_RNG.getrandbits(128), version=4)
+
 
 def index_to_label(index: int) -> str:
-    return ["A", "B", "C", "D"][index]
+    return _LABELS[index]
 
 
 def label_to_index(label: Literal["A", "B", "C", "D"]) -> int:
-    return ["A", "B", "C", "D"].index(label)
+    return _LABEL_TO_INDEX[label]
 
 
 def generate_labelled_options(options: list[str]) -> str:
@@ -28,30 +83,45 @@ def generate_labelled_options(options: list[str]) -> str:
     Choice B: 2
     ```
     """
-    labels = [index_to_label(i) for i in range(len(options))]
     return "\n".join(
-        f"Choice {label}: {option}" for label, option in zip(labels, options)
+        f"Choice {label}: {option}" for label, option in zip(_LABELS, options)
     )
 
 
-@dataclass
+@dataclass(slots=True)
 class MMLUMathQuestion:
     id: int
     content: str
     options: list[str]
     correct_option_index: int
 
+    # A plain property rather than cached_property: slotted instances have no
+    # __dict__ for cached_property to store into, and the lookup is trivial.
     @property
     def first_incorrect_option_index(self) -> int:
         return [i for i in range(4) if i != self.correct_option_index][0]
 
 
-@dataclass
+@dataclass(slots=True)
 class ZeroShotFourOptionResponse:
     id: UUID
     question_id: int
     response: str
     model_id: MODEL_IDS
+    is_correct: Optional[bool] = None
+
+    def get_is_correct(self, correct_option_index: int) -> Optional[bool]:
+        """
+        Returns `None` when the response does not name exactly one option
+        label, since we cannot tell which option was picked.
+        """
+        label = extract_label(self.response)
+        if label is None:
+            return None
+        return label == index_to_label(correct_option_index)
+
+    def set_is_correct(self, correct_option_index: int):
+        self.is_correct = self.get_is_correct(correct_option_index)
 
 
 RESPONSE_LENGTHS = Literal["short", "medium", "long"]
@@ -62,7 +132,7 @@ RESPONSE_LENGHTHS_TO_VALUE_MAP: dict[RESPONSE_LENGTHS, str] = {
 }
 
 
-@dataclass
+@dataclass(slots=True)
 class SelectedOptionArgumentResponse:
     id: UUID
     question_id: int
@@ -72,24 +142,46 @@ class SelectedOptionArgumentResponse:
     argument: str
 
 
-@dataclass
+@dataclass(slots=True)
 class BaselineArgumentClassificationResponse:
     id: UUID
     question_id: int
     selected_option_index: int
     model_id: MODEL_IDS
     classification: str
+    is_correct: Optional[bool] = None
+
+    def get_is_correct(self, selected_option_is_correct: bool) -> Optional[bool]:
+        if _INCORRECT_RE.search(self.classification):
+            return not selected_option_is_correct
+        if _CORRECT_RE.search(self.classification):
+            return selected_option_is_correct
+        return None
 
+    def set_is_correct(self, selected_option_is_correct: bool):
+        self.is_correct = self.get_is_correct(selected_option_is_correct)
 
-@dataclass
+
+@dataclass(slots=True)
 class ArgumentClassificationResponse:
     id: UUID
     argument_id: UUID
     model_id: MODEL_IDS
     classification: str
+    is_correct: Optional[bool] = None
+
+    def get_is_correct(self, selected_option_is_correct: bool) -> Optional[bool]:
+        if _INCORRECT_RE.search(self.classification):
+            return not selected_option_is_correct
+        if _CORRECT_RE.search(self.classification):
+            return selected_option_is_correct
+        return None
 
+    def set_is_correct(self, selected_option_is_correct: bool):
+        self.is_correct = self.get_is_correct(selected_option_is_correct)
 
-@dataclass
+
+@dataclass(slots=True)
 class BaseTwoOptionResponse:
     id: UUID
     question_id: int
@@ -98,13 +190,31 @@ class BaseTwoOptionResponse:
     ordering: Literal["correct_first", "incorrect_first"]
     model_id: MODEL_IDS
     response: str
+    # kw_only so subclasses can still declare required fields after this one.
+    is_correct: Optional[bool] = field(default=None, kw_only=True)
+
+    def get_is_correct(self) -> Optional[bool]:
+        """
+        The correct option is shown as Choice A under the `correct_first`
+        ordering and Choice B under `incorrect_first`. Returns `None` when
+        the response does not name exactly one of the two labels.
+        """
+        label = extract_label(self.response, valid_labels=_LABELS[:2])
+        if label is None:
+            return None
+        correct_label = "A" if self.ordering == "correct_first" else "B"
+        return label == correct_label
 
+    def set_is_correct(self):
+        self.is_correct = self.get_is_correct()
 
-@dataclass
+
+@dataclass(slots=True)
 class ZeroShotTwoOptionResponse(BaseTwoOptionResponse):
+    pass
 
 
-@dataclass
+@dataclass(slots=True)
 class TwoOptionDebateResponse(BaseTwoOptionResponse):
     correct_option_argument_id: UUID
     incorrect_option_argument_id: UUID
@@ -115,12 +225,43 @@ def dump_db_to_csv(db: dict[int, Any] | dict[UUID, Any], filename_prefix: str):
     Dumps a list of dataclasses to a CSV file.
     """
     db_rows_list = list(db.values())
-    fieldnames: list[str] = list(asdict(db_rows_list[0]).keys())
+    fieldnames: list[str] = [field.name for field in fields(db_rows_list[0])]
     timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
     filename = f"{filename_prefix}_{timestamp}.csv"
 
-    with open(filename, "w", newline="") as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        for row in db_rows_list:
-            writer.writerow(asdict(row))
+    def row_values(row: Any) -> list[Any]:
+        # Plain attribute access instead of asdict(), which deep-copies every
+        # nested container (e.g. question options) per row.
+        return [
+            _json_dumps(value) if isinstance(value, (list, dict)) else value
+            for value in (getattr(row, name) for name in fieldnames)
+        ]
+
+    # A 1 MiB buffer keeps large dumps from flushing to disk line by line.
+    with open(filename, "w", newline="", buffering=1 << 20) as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(fieldnames)
+        writer.writerows(row_values(row) for row in db_rows_list)
+
+
+def dump_db_to_parquet(db: dict[int, Any] | dict[UUID, Any], filename_prefix: str):
+    """
+    Dumps a list of dataclasses to a Parquet file. Columnar storage keeps
+    each field contiguous, so downstream filters (e.g. on `model_id` or
+    `is_correct`) run as vectorized Arrow/NumPy ops instead of Python-level
+    scans over row objects.
+    """
+    db_rows_list = list(db.values())
+    fieldnames: list[str] = [field.name for field in fields(db_rows_list[0])]
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    filename = f"{filename_prefix}_{timestamp}.parquet"
+
+    def column_value(value: Any) -> Any:
+        # Arrow has no UUID type, so ids are stored as strings.
+        return str(value) if isinstance(value, UUID) else value
+
+    columns = {
+        name: [column_value(getattr(row, name)) for row in db_rows_list]
+        for name in fieldnames
+    }
+    pq.write_table(pa.table(columns), filename)
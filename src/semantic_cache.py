@@ -0,0 +1,44 @@
+from typing import Optional
+
+import faiss
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+_EMBEDDING_MODEL_ID = "sentence-transformers/all-MiniLM-L6-v2"
+SIMILARITY_THRESHOLD = 0.92
+
+
+class SemanticCache:
+    """
+    Embedding-similarity cache over prompts. Classification prompts differ
+    only in their trailing option/argument text, and paraphrased arguments
+    almost always classify identically, so a prompt whose embedding is within
+    `similarity_threshold` cosine similarity of a cached one reuses the
+    cached response instead of calling the API.
+    """
+
+    def __init__(self, similarity_threshold: float = SIMILARITY_THRESHOLD):
+        self.similarity_threshold = similarity_threshold
+        self._model = SentenceTransformer(_EMBEDDING_MODEL_ID)
+        self._index = faiss.IndexFlatIP(
+            self._model.get_sentence_embedding_dimension()
+        )
+        self._responses: list[str] = []
+
+    def _embed(self, prompt: str) -> np.ndarray:
+        # Normalized embeddings make the inner-product index equivalent to
+        # cosine similarity.
+        embedding = self._model.encode([prompt], normalize_embeddings=True)
+        return np.asarray(embedding, dtype=np.float32)
+
+    def get(self, prompt: str) -> Optional[str]:
+        if not self._responses:
+            return None
+        scores, indices = self._index.search(self._embed(prompt), 1)
+        if scores[0][0] > self.similarity_threshold:
+            return self._responses[indices[0][0]]
+        return None
+
+    def add(self, prompt: str, response: str):
+        self._index.add(self._embed(prompt))
+        self._responses.append(response)